@@ -1,73 +1,222 @@
 #!/usr/bin/env python3
-import argparse
-import fcntl
-import json
 import os
 import subprocess
 import sys
-from typing import List, Optional, Tuple
-
-STATE_FILE = os.path.expanduser("~/.cache/waybar/mpris_state.json")
+import time
+from json.encoder import encode_basestring_ascii
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mpris_common import (
+    PLAYERCTL_ENV,
+    load_last_player,
+    load_state,
+    normalize_player_name,
+    playerctl_bin,
+    run_playerctl,
+    save_last_player,
+    save_state,
+)
+
+# Talking DBus directly skips the playerctl fork (and its GLib spin-up)
+# entirely; without dbus-next we fall back to the subprocess path below.
+try:
+    import asyncio
+
+    from dbus_next import Message, MessageType
+    from dbus_next.aio import MessageBus
+except ImportError:
+    MessageBus = None
+
+# How long a cached one-shot payload stays valid. Just under the old 1s poll,
+# so several bars ticking at once share a single MPRIS fetch.
+CACHE_TTL = 0.8
+
+# Pause between respawns of the playerctl --follow child after it dies
+# (playerctl crash, dbus restart, binary not installed yet)
+FOLLOW_RETRY_DELAY = 3.0
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+
+# One metadata call that also carries the player name and status, so a single
+# playerctl invocation replaces list-all + per-player status + metadata.
+FIELD_SEP = "|||"
+METADATA_FORMAT = FIELD_SEP.join(
+    ("{{playerName}}", "{{status}}", "{{artist}}", "{{title}}", "{{mpris:trackid}}")
+)
 
 
 # ---------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------
-def run_playerctl(args: List[str]) -> str:
-    """Run playerctl with given args, return stdout as string or empty on error."""
-    try:
-        # Use absolute path to playerctl to avoid PATH issues
-        playerctl_bin = "/usr/bin/playerctl"
-        if not os.path.exists(playerctl_bin):
-            # Fallback to PATH lookup
-            playerctl_bin = "playerctl"
-        
-        out = subprocess.check_output([playerctl_bin] + args, stderr=subprocess.DEVNULL)
-        return out.decode("utf-8").strip()
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return ""
-
-
-def load_last_player() -> Optional[str]:
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            data = json.load(f)
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data.get("player") or None
-    except Exception:
+def load_cached_output(args_key, ttl=CACHE_TTL):
+    """Return the payload a recent identical invocation wrote, if still fresh."""
+    state = load_state()
+    if state.get("args_key") != args_key:
         return None
+    ts = state.get("ts")
+    if not isinstance(ts, (int, float)) or time.time() - ts >= ttl:
+        return None
+    output = state.get("output")
+    return output if isinstance(output, dict) else None
+
+
+# Built once at import so slugify_class is a single C-level translate call
+# instead of a per-character Python loop. Player names are ASCII bus names.
+_SLUG_TABLE = {
+    c: (chr(c) if chr(c).isalnum() or chr(c) == '.' else '_') for c in range(128)
+}
+
+
+def slugify_class(s):
+    """Make a CSS-safe class token from a player name."""
+    token = (s or "").lower().translate(_SLUG_TABLE).strip("_.")
+    return token or "player"
+
+
+def parse_player_line(line):
+    """Parse one METADATA_FORMAT line into (name, (status, artist, title, trackid))."""
+    parts = line.split(FIELD_SEP)
+    # Pad so missing trailing fields become None
+    parts += [""] * (5 - len(parts))
+    name = parts[0].strip() or None
+    info = tuple(p.strip() or None for p in parts[1:5])
+    return name, info
+
+
+async def _dbus_get_property(bus, destination, prop):
+    """Properties.Get on the MPRIS player interface, or None on any error."""
+    reply = await bus.call(
+        Message(
+            destination=destination,
+            path=MPRIS_PATH,
+            interface="org.freedesktop.DBus.Properties",
+            member="Get",
+            signature="ss",
+            body=[MPRIS_PLAYER_IFACE, prop],
+        )
+    )
+    if reply.message_type != MessageType.METHOD_RETURN:
+        return None
+    return reply.body[0].value
+
+
+def _player_info_from_dbus(status, metadata):
+    """Unwrap an MPRIS Metadata a{sv} dict into our (status, artist, title, trackid)."""
+    metadata = metadata or {}
+
+    def unwrap(key):
+        variant = metadata.get(key)
+        return variant.value if variant is not None else None
+
+    artist = unwrap("xesam:artist")
+    if isinstance(artist, list):
+        artist = ", ".join(a for a in artist if a)
+
+    title = unwrap("xesam:title")
+    trackid = unwrap("mpris:trackid")
+    if trackid is not None:
+        trackid = str(trackid)
 
+    return (status or None, artist or None, title or None, trackid or None)
 
-def save_last_player(name: str) -> None:
-    """Persist last chosen player with an atomic write and file locking."""
+
+async def _dbus_fetch_players():
+    """Enumerate MPRIS bus names and read status/metadata without any subprocess."""
+    bus = await MessageBus().connect()
     try:
-        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            json.dump({"player": name}, f)
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-    except Exception:
-        # Not critical if this fails
-        pass
+        reply = await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="ListNames",
+            )
+        )
+        destinations = [n for n in reply.body[0] if n.startswith(MPRIS_PREFIX)]
+
+        # The per-player Gets are independent, so issue them all at once and
+        # pay one round-trip instead of 2*N sequential ones.
+        results = await asyncio.gather(
+            *(_dbus_get_property(bus, d, "PlaybackStatus") for d in destinations),
+            *(_dbus_get_property(bus, d, "Metadata") for d in destinations),
+        )
+
+        players = {}
+        count = len(destinations)
+        for i, destination in enumerate(destinations):
+            name = destination[len(MPRIS_PREFIX):]
+            players[name] = _player_info_from_dbus(results[i], results[count + i])
+        return players
+    finally:
+        bus.disconnect()
+
+
+def fetch_players(debug=False):
+    """
+    Return all players as an ordered {name: (status, artist, title, trackid)} dict.
+    Prefers direct DBus (no fork at all); otherwise a single `playerctl -a
+    metadata` call lists, statuses and fetches metadata in one subprocess.
+    """
+    if MessageBus is not None:
+        try:
+            players = asyncio.run(_dbus_fetch_players())
+            if debug:
+                print(f"[debug] players (dbus): {list(players)}", file=sys.stderr)
+            return players
+        except Exception as e:
+            if debug:
+                print(f"[debug] dbus fetch failed ({e}), using playerctl", file=sys.stderr)
+
+    out = run_playerctl(["-a", "metadata", "--format", METADATA_FORMAT])
+    players = {}
+    for line in out.splitlines():
+        name, info = parse_player_line(line)
+        if name:
+            players[name] = info
 
+    if debug:
+        print(f"[debug] players (raw): {list(players)}", file=sys.stderr)
 
-def normalize_player_name(name: str) -> str:
-    """Strip instance numbers for better matching (e.g., spotify.instance123 -> spotify)."""
-    return name.split('.')[0] if '.' in name else name
+    return players
 
 
-def slugify_class(s: str) -> str:
-    """Make a CSS-safe class token from a player name."""
-    s = (s or "").lower()
-    out = []
-    for ch in s:
-        out.append(ch if ch.isalnum() or ch == '.' else "_")
-    token = "".join(out).strip("_.")
-    return token or "player"
+async def _dbus_fetch_player(destination):
+    bus = await MessageBus().connect()
+    try:
+        status, metadata = await asyncio.gather(
+            _dbus_get_property(bus, destination, "PlaybackStatus"),
+            _dbus_get_property(bus, destination, "Metadata"),
+        )
+        return _player_info_from_dbus(status, metadata)
+    finally:
+        bus.disconnect()
+
 
+def fetch_player(name, debug=False):
+    """
+    Fetch a single player's info without enumerating the bus. Returns the
+    (status, artist, title, trackid) tuple, or None if the player is gone.
+    """
+    if MessageBus is not None:
+        try:
+            info = asyncio.run(_dbus_fetch_player(MPRIS_PREFIX + name))
+            if info[0]:
+                return info
+            return None
+        except Exception as e:
+            if debug:
+                print(f"[debug] dbus fetch failed ({e}), using playerctl", file=sys.stderr)
+
+    out = run_playerctl(["--player", name, "metadata", "--format", METADATA_FORMAT])
+    if not out:
+        return None
+    parsed_name, info = parse_player_line(out.splitlines()[0])
+    return info if parsed_name else None
 
-def choose_player(selected: Optional[str], excluded: List[str], debug: bool = False) -> Optional[str]:
+
+def choose_player(selected, excluded, players, debug=False):
     """
     Pick the active player with memory:
 
@@ -80,23 +229,24 @@ def choose_player(selected: Optional[str], excluded: List[str], debug: bool = Fa
     """
     excluded_set = set(p for p in excluded if p)
 
-    names_str = run_playerctl(["--list-all"])
-    if not names_str:
+    names = list(players)
+    if not names:
         if debug:
-            print("[debug] playerctl --list-all returned nothing", file=sys.stderr)
+            print("[debug] no players found", file=sys.stderr)
         return None
 
-    names = [n.strip() for n in names_str.splitlines() if n.strip()]
-    if debug:
-        print(f"[debug] players (raw): {names}", file=sys.stderr)
+    # Normalize every name once up front; the filters and last-player match
+    # below would otherwise re-normalize the same names several times over.
+    normalized = {n: normalize_player_name(n) for n in names}
 
     # Apply user filters
     if selected:
-        names = [n for n in names if normalize_player_name(n) == normalize_player_name(selected)]
+        target = normalize_player_name(selected)
+        names = [n for n in names if normalized[n] == target]
         if debug:
             print(f"[debug] players (forced={selected}): {names}", file=sys.stderr)
     else:
-        names = [n for n in names if normalize_player_name(n) not in excluded_set]
+        names = [n for n in names if normalized[n] not in excluded_set]
         if debug and excluded_set:
             print(f"[debug] players (excluded={sorted(excluded_set)}): {names}", file=sys.stderr)
 
@@ -109,21 +259,20 @@ def choose_player(selected: Optional[str], excluded: List[str], debug: bool = Fa
     # Match by normalized name for better instance handling
     if last_player:
         last_normalized = normalize_player_name(last_player)
-        matching = [n for n in names if normalize_player_name(n) == last_normalized]
+        matching = [n for n in names if normalized[n] == last_normalized]
         last_player = matching[0] if matching else None
-    
+
     if debug:
         print(f"[debug] last_player (valid): {last_player}", file=sys.stderr)
 
-    # Cache statuses once
-    statuses = {name: run_playerctl(["--player", name, "status"]) for name in names}
+    statuses = {n: players[n][0] for n in names}
     if debug:
         print(f"[debug] statuses: {statuses}", file=sys.stderr)
 
     playing = [n for n in names if statuses.get(n) == "Playing"]
     paused = [n for n in names if statuses.get(n) == "Paused"]
 
-    chosen: Optional[str] = None
+    chosen = None
 
     if playing:
         if last_player and statuses.get(last_player) == "Playing":
@@ -138,49 +287,17 @@ def choose_player(selected: Optional[str], excluded: List[str], debug: bool = Fa
         else:
             chosen = names[0]
 
-    if chosen:
-        save_last_player(chosen)
-
     if debug:
         print(f"[debug] chosen: {chosen}", file=sys.stderr)
 
+    # The caller persists the choice along with its payload in one write
     return chosen
 
 
-def get_player_info(player_name: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
-    """
-    Return (status, artist, title, trackid) for a given player.
-    Uses a single metadata call that also includes status.
-    """
-    fmt = "{{status}}|||{{artist}}|||{{title}}|||{{mpris:trackid}}"
-    meta = run_playerctl(["--player", player_name, "metadata", "--format", fmt])
-
-    status, artist, title, trackid = None, None, None, None
-
-    if meta:
-        parts = meta.split("|||")
-        if len(parts) >= 1:
-            status = parts[0].strip() or None
-        if len(parts) >= 2:
-            artist = parts[1].strip() or None
-        if len(parts) >= 3:
-            title = parts[2].strip() or None
-        if len(parts) >= 4:
-            trackid = parts[3].strip() or None
-
-    return status, artist, title, trackid
-
-
 # ---------------------------------------------------------
 # Build output for Waybar
 # ---------------------------------------------------------
-def build_output(
-    player_name: Optional[str],
-    status: Optional[str],
-    artist: Optional[str],
-    title: Optional[str],
-    trackid: Optional[str],
-):
+def build_output(player_name, status, artist, title, trackid):
     """Build the JSON payload Waybar expects. Returns None if module should be hidden."""
     if not player_name:
         return None
@@ -233,55 +350,191 @@ def hidden_payload():
     return {"text": "", "alt": "", "class": "hidden"}
 
 
+def emit_line(line):
+    """Write one payload line straight to fd 1: one syscall, no buffer, no flush."""
+    os.write(1, (line + "\n").encode("utf-8", "replace"))
+
+
+def encode_payload(payload):
+    """
+    Encode the fixed {text, class, alt} payload by hand instead of spinning up
+    json.dumps for three short strings. encode_basestring_ascii is the
+    C-implemented quoter json.dumps itself uses, so every control character
+    that can show up in malformed track metadata is escaped correctly.
+    """
+    text = encode_basestring_ascii(payload.get("text") or "")
+    css_class = encode_basestring_ascii(payload.get("class") or "")
+    alt = encode_basestring_ascii(payload.get("alt") or "")
+    return f'{{"text": {text}, "class": {css_class}, "alt": {alt}}}'
+
+
+def follow_loop(selected, excluded, debug=False):
+    """
+    Long-running mode: one playerctl --follow process streams MPRIS changes
+    over DBus, and we emit a JSON line only when the rendered output changes.
+    No fork/exec per tick — Waybar runs this via "exec" with no interval.
+    """
+    excluded_set = set(p for p in excluded if p)
+    selected_normalized = normalize_player_name(selected) if selected else None
+
+    cmd = [playerctl_bin(), "-a", "--follow", "metadata", "--format", METADATA_FORMAT]
+    last_emitted = None
+
+    def emit(payload):
+        nonlocal last_emitted
+        line = encode_payload(payload)
+        if line == last_emitted:
+            return
+        last_emitted = line
+        emit_line(line)
+
+    while True:
+        try:
+            with subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                close_fds=False,
+                env=PLAYERCTL_ENV,
+            ) as proc:
+                # Assume nothing is playing until playerctl says otherwise
+                emit(hidden_payload())
+                for raw in proc.stdout:
+                    line = raw.strip()
+                    if not line:
+                        # playerctl prints a blank line when the player goes away
+                        emit(hidden_payload())
+                        continue
+
+                    name, info = parse_player_line(line)
+                    if not name:
+                        continue
+                    if selected_normalized:
+                        if normalize_player_name(name) != selected_normalized:
+                            continue
+                    elif normalize_player_name(name) in excluded_set:
+                        continue
+
+                    if debug:
+                        print(f"[debug] follow: {name}: {info}", file=sys.stderr)
+
+                    output = build_output(name, *info)
+                    if output:
+                        # Keep the click wrapper's sticky state in sync
+                        save_last_player(name)
+                    emit(output if output else hidden_payload())
+        except FileNotFoundError:
+            pass
+
+        # The child exited: hide the module and respawn it so the bar heals
+        # itself — waybar runs continuous exec modules without any restart.
+        if debug:
+            print("[debug] playerctl --follow exited, retrying", file=sys.stderr)
+        emit(hidden_payload())
+        time.sleep(FOLLOW_RETRY_DELAY)
+
+
 # ---------------------------------------------------------
 # CLI and entry point
 # ---------------------------------------------------------
-def parse_args():
-    parser = argparse.ArgumentParser(
-        description="Waybar media player module (one-shot, polled)",
-        add_help=False,
-    )
-    parser.add_argument("--player", help="Force a specific player name")
-    parser.add_argument(
-        "-x",
-        "--exclude",
-        default="",
-        help="Comma-separated list of players to ignore",
-    )
-    parser.add_argument("--debug", action="store_true", help="Print debug info to stderr")
-    return parser.parse_args()
+class Args:
+    player = None  # force a specific player name
+    exclude = ""  # comma-separated list of players to ignore
+    debug = False  # print debug info to stderr
+    follow = False  # stay running, stream updates via playerctl --follow
+
+
+def parse_args(argv=None):
+    """
+    Tiny hand-rolled parser for the four flags this script takes; importing
+    argparse would cost more at startup than everything else here combined.
+    Accepts both --flag value and --flag=value; unknown flags are ignored.
+    """
+    args = Args()
+    argv = sys.argv[1:] if argv is None else argv
+    i = 0
+    while i < len(argv):
+        key, sep, inline = argv[i].partition("=")
+        if key == "--player":
+            args.player = inline if sep else (argv[i + 1] if i + 1 < len(argv) else None)
+            i += 1 if sep else 2
+        elif key in ("-x", "--exclude"):
+            args.exclude = inline if sep else (argv[i + 1] if i + 1 < len(argv) else "")
+            i += 1 if sep else 2
+        elif key == "--debug":
+            args.debug = True
+            i += 1
+        elif key == "--follow":
+            args.follow = True
+            i += 1
+        else:
+            i += 1
+    return args
 
 
 def main():
     args = parse_args()
-    
+
     try:
         excluded = [p.strip() for p in args.exclude.split(",") if p.strip()]
 
-        player_name = choose_player(args.player, excluded, debug=args.debug)
+        if args.follow:
+            follow_loop(args.player, excluded, debug=args.debug)
+            return
 
-        if not player_name:
-            sys.stdout.write(json.dumps(hidden_payload()) + "\n")
-            sys.stdout.flush()
+        # Identical invocations within the TTL reuse the last payload so
+        # several bars ticking together only pay for one MPRIS fetch.
+        args_key = f"{args.player or ''}|{','.join(sorted(excluded))}"
+        cached = load_cached_output(args_key)
+        if cached is not None:
+            if args.debug:
+                print("[debug] serving cached output", file=sys.stderr)
+            emit_line(encode_payload(cached))
             return
 
-        status, artist, title, trackid = get_player_info(player_name)
-        if args.debug:
-            print(
-                f"[debug] info: player={player_name!r} status={status!r} artist={artist!r} title={title!r} trackid={trackid!r}",
-                file=sys.stderr,
-            )
+        players = {}
+        player_name = None
+
+        # Fast path: a forced --player that matches the remembered one can be
+        # queried directly, skipping bus enumeration and the priority logic.
+        if args.player:
+            last = load_last_player()
+            if last and normalize_player_name(last) == normalize_player_name(args.player):
+                info = fetch_player(last, debug=args.debug)
+                if info:
+                    if args.debug:
+                        print(f"[debug] fast path hit for {last}", file=sys.stderr)
+                    player_name = last
+                    players = {last: info}
+
+        if not player_name:
+            players = fetch_players(debug=args.debug)
+            player_name = choose_player(args.player, excluded, players, debug=args.debug)
+
+        if player_name:
+            status, artist, title, trackid = players[player_name]
+            if args.debug:
+                print(
+                    f"[debug] info: player={player_name!r} status={status!r} artist={artist!r} title={title!r} trackid={trackid!r}",
+                    file=sys.stderr,
+                )
+            output = build_output(player_name, status, artist, title, trackid)
+        else:
+            output = None
+
+        payload = output if output else hidden_payload()
+        updates = {"output": payload, "ts": time.time(), "args_key": args_key}
+        if player_name:
+            updates["player"] = player_name
+        save_state(updates)
+        emit_line(encode_payload(payload))
 
-        output = build_output(player_name, status, artist, title, trackid)
-        sys.stdout.write(json.dumps(output if output else hidden_payload()) + "\n")
-        sys.stdout.flush()
-    
     except Exception as e:
         if args.debug:
             print(f"[error] {e}", file=sys.stderr)
-        sys.stdout.write(json.dumps(hidden_payload()) + "\n")
-        sys.stdout.flush()
+        emit_line(encode_payload(hidden_payload()))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
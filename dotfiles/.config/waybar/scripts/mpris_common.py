@@ -0,0 +1,116 @@
+"""Shared MPRIS plumbing for the waybar media scripts.
+
+mediaplayer.py (the bar module) and playerctl-wrapper.py (the click handler)
+used to carry their own copies of the playerctl runner, the state file
+helpers and the name normalizer. They live here once instead, so the sticky
+last-player state and the spawn fast paths stay in sync between the two.
+"""
+import json
+import os
+
+# orjson parses/serializes the state file a few times faster than the stdlib;
+# purely optional, the json module covers its absence.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STATE_FILE = os.path.expanduser("~/.cache/waybar/mpris_state.json")
+
+# Trimmed environment for playerctl: just enough to find the session bus.
+# Handing the child a tiny env (and leaving inherited fds alone instead of
+# walking/closing them all) shaves setup cost off every fork. A literal
+# env={} would break DBus discovery.
+PLAYERCTL_ENV = {
+    k: v
+    for k, v in os.environ.items()
+    if k in ("DBUS_SESSION_BUS_ADDRESS", "XDG_RUNTIME_DIR", "PATH", "HOME")
+}
+
+
+def playerctl_bin():
+    """Absolute path to playerctl, or the bare name for a PATH lookup."""
+    return "/usr/bin/playerctl" if os.path.exists("/usr/bin/playerctl") else "playerctl"
+
+
+def run_playerctl(args):
+    """
+    Run playerctl with given args, return stdout as string or empty on error.
+
+    Spawns via os.posix_spawn instead of subprocess: one pipe, one spawn, one
+    waitpid — none of Popen's object setup or fd bookkeeping.
+    """
+    binary = playerctl_bin()
+    spawn = os.posix_spawn if binary.startswith("/") else os.posix_spawnp
+
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = spawn(
+            binary,
+            [binary] + args,
+            PLAYERCTL_ENV,
+            file_actions=(
+                (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0o644),
+                (os.POSIX_SPAWN_CLOSE, read_fd),
+                (os.POSIX_SPAWN_CLOSE, write_fd),
+            ),
+        )
+    except OSError:
+        os.close(read_fd)
+        os.close(write_fd)
+        return ""
+
+    os.close(write_fd)
+    chunks = []
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read_fd)
+
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        return ""
+    return b"".join(chunks).decode("utf-8").strip()
+
+
+def load_state():
+    try:
+        with open(STATE_FILE, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_state(updates):
+    """Merge updates into the state file. Atomic rename instead of locking:
+    readers always see a complete old or new file, never a torn write."""
+    try:
+        state = load_state()
+        state.update(updates)
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+        blob = orjson.dumps(state) if orjson is not None else json.dumps(state).encode("utf-8")
+        tmp_file = STATE_FILE + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(blob)
+        os.rename(tmp_file, STATE_FILE)
+    except Exception:
+        # Not critical if this fails
+        pass
+
+
+def load_last_player():
+    return load_state().get("player") or None
+
+
+def save_last_player(name):
+    save_state({"player": name})
+
+
+def normalize_player_name(name):
+    """Strip instance numbers for better matching (e.g., spotify.instance123 -> spotify)."""
+    return name.split('.')[0] if '.' in name else name
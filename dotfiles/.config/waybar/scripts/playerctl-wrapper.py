@@ -1,57 +1,19 @@
 #!/usr/bin/env python3
 import argparse
-import fcntl
-import json
 import os
 import subprocess
 import sys
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-STATE_FILE = os.path.expanduser("~/.cache/waybar/mpris_state.json")
-
-
-def run_playerctl(args: List[str]) -> str:
-    """Run playerctl with absolute path to avoid PATH issues."""
-    try:
-        # Use absolute path to playerctl
-        playerctl_bin = "/usr/bin/playerctl"
-        if not os.path.exists(playerctl_bin):
-            # Fallback to PATH lookup
-            playerctl_bin = "playerctl"
-        
-        out = subprocess.check_output([playerctl_bin] + args, stderr=subprocess.DEVNULL)
-        return out.decode("utf-8").strip()
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return ""
-
-
-def load_last_player() -> Optional[str]:
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
-            data = json.load(f)
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-        return data.get("player") or None
-    except Exception:
-        return None
-
-
-def save_last_player(name: str) -> None:
-    """Persist last chosen player with file locking."""
-    try:
-        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-            json.dump({"player": name}, f)
-            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
-    except Exception:
-        pass
-
-
-def normalize_player_name(name: str) -> str:
-    """Strip instance numbers for better matching."""
-    return name.split('.')[0] if '.' in name else name
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mpris_common import (
+    load_last_player,
+    normalize_player_name,
+    playerctl_bin,
+    run_playerctl,
+    save_last_player,
+)
 
 
 def list_players() -> List[str]:
@@ -62,17 +24,34 @@ def list_players() -> List[str]:
 
 
 def statuses_for(players: List[str]) -> Dict[str, str]:
-    return {p: run_playerctl(["--player", p, "status"]) for p in players}
+    """All statuses in one batched playerctl call instead of one fork each."""
+    if not players:
+        return {}
+    out = run_playerctl([
+        "--player", ",".join(players), "-a",
+        "metadata", "--format", "{{playerName}}\t{{status}}",
+    ])
+    statuses: Dict[str, str] = {}
+    for line in out.splitlines():
+        pname, _, pstatus = line.partition("\t")
+        if pname.strip():
+            statuses[pname.strip()] = pstatus.strip()
+    if not statuses:
+        # Older playerctl without batched format support
+        statuses = {p: run_playerctl(["--player", p, "status"]) for p in players}
+    return statuses
 
 
 def choose_player(
     selected: Optional[str] = None,
     excluded: Optional[List[str]] = None,
     debug: bool = False,
-) -> Optional[str]:
+) -> Tuple[Optional[str], Optional[str]]:
     """
     Sticky selection (same logic as mediaplayer.py).
     Uses the saved last-player as a preference.
+    Returns (player, status) so callers don't re-read the status they
+    already paid for here.
     """
     excluded = excluded or []
     excluded_set = set(p for p in excluded if p)
@@ -82,7 +61,7 @@ def choose_player(
         print(f"[debug] players (raw): {names}", file=sys.stderr)
 
     if not names:
-        return None
+        return None, None
 
     if selected:
         names = [n for n in names if normalize_player_name(n) == normalize_player_name(selected)]
@@ -94,7 +73,7 @@ def choose_player(
             print(f"[debug] players (excluded={sorted(excluded_set)}): {names}", file=sys.stderr)
 
     if not names:
-        return None
+        return None, None
 
     last_player = load_last_player()
     # Match by normalized name
@@ -115,16 +94,17 @@ def choose_player(
 
     if playing:
         if last_player and statuses.get(last_player) == "Playing":
-            return last_player
-        return playing[0]
-
-    if last_player and statuses.get(last_player) in ("Playing", "Paused"):
-        return last_player
-
-    if paused:
-        return paused[0]
+            chosen = last_player
+        else:
+            chosen = playing[0]
+    elif last_player and statuses.get(last_player) in ("Playing", "Paused"):
+        chosen = last_player
+    elif paused:
+        chosen = paused[0]
+    else:
+        chosen = names[0]
 
-    return names[0]
+    return chosen, statuses.get(chosen)
 
 
 def try_command(player: str, cmd_args: List[str], debug: bool = False) -> int:
@@ -132,15 +112,11 @@ def try_command(player: str, cmd_args: List[str], debug: bool = False) -> int:
     Run a playerctl command for a specific player, returning the exit code.
     """
     try:
-        # Use absolute path to playerctl
-        playerctl_bin = "/usr/bin/playerctl"
-        if not os.path.exists(playerctl_bin):
-            playerctl_bin = "playerctl"
-        
+        # Only pay for the stderr pipe (and its decode) when we'll print it
         res = subprocess.run(
-            [playerctl_bin, "--player", player] + cmd_args,
+            [playerctl_bin(), "--player", player] + cmd_args,
             stdout=subprocess.DEVNULL,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.PIPE if debug else subprocess.DEVNULL,
             text=True,
         )
         if debug:
@@ -197,12 +173,8 @@ def maybe_resume_before_skip(
         print(f"[debug] resuming before {cmd_args[0]}", file=sys.stderr)
 
     try:
-        playerctl_bin = "/usr/bin/playerctl"
-        if not os.path.exists(playerctl_bin):
-            playerctl_bin = "playerctl"
-        
         subprocess.run(
-            [playerctl_bin, "--player", player, "play"],
+            [playerctl_bin(), "--player", player, "play"],
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
         )
@@ -239,14 +211,14 @@ def main():
     if not cmd_args:
         cmd_args = ["play-pause"]
 
-    player = choose_player(selected=args.player, excluded=excluded, debug=args.debug)
+    player, status = choose_player(selected=args.player, excluded=excluded, debug=args.debug)
     if not player:
         if args.debug:
             print("[debug] no player found", file=sys.stderr)
         sys.exit(0)
 
     # If we're about to next/previous while paused, resume first (fixes Spotify)
-    status = statuses_for([player]).get(player)
+    # (status comes straight from choose_player's batched read)
     if args.debug:
         print(f"[debug] target player: {player}, status: {status}", file=sys.stderr)
     maybe_resume_before_skip(player, status, cmd_args, debug=args.debug)